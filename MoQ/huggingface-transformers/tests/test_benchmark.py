@@ -12,20 +12,106 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import copy
 import os
+import shutil
 import tempfile
 import unittest
 from pathlib import Path
+from unittest import mock
 
-from transformers import AutoConfig, is_torch_available
-from transformers.testing_utils import require_torch, torch_device
+from transformers import BartConfig, GPT2Config, is_torch_available
+from transformers.testing_utils import require_torch, require_torch_gpu, slow
 
 if is_torch_available():
-    from transformers import PyTorchBenchmark, PyTorchBenchmarkArguments
+    import torch
 
+    from transformers import PyTorchBenchmark, PyTorchBenchmarkArguments
 
-@require_torch
-class BenchmarkTest(unittest.TestCase):
+# Tiny configs are written to disk once per module so the benchmark can
+# resolve them as local model ids instead of going through the hub cache.
+TINY_GPT2_DIR = None
+TINIER_BART_DIR = None
+_TMP_DIR = None
+_TINY_CONFIGS = {}
+
+
+def setUpModule():
+    global TINY_GPT2_DIR, TINIER_BART_DIR, _TMP_DIR
+    _TMP_DIR = tempfile.mkdtemp()
+    TINY_GPT2_DIR = os.path.join(_TMP_DIR, "tiny-gpt2")
+    TINIER_BART_DIR = os.path.join(_TMP_DIR, "tinier-bart")
+
+    gpt2_config = GPT2Config(
+        vocab_size=99,
+        n_positions=32,
+        n_ctx=32,
+        n_embd=8,
+        n_layer=1,
+        n_head=2,
+        bos_token_id=98,
+        eos_token_id=98,
+        architectures=["GPT2LMHeadModel"],
+    )
+    bart_config = BartConfig(
+        vocab_size=99,
+        max_position_embeddings=32,
+        d_model=8,
+        encoder_layers=1,
+        decoder_layers=1,
+        encoder_attention_heads=2,
+        decoder_attention_heads=2,
+        encoder_ffn_dim=8,
+        decoder_ffn_dim=8,
+        architectures=["BartForConditionalGeneration"],
+    )
+    tiny_configs = [(TINY_GPT2_DIR, gpt2_config),
+                    (TINIER_BART_DIR, bart_config)]
+    for path, config in tiny_configs:
+        config.save_pretrained(path)
+        _TINY_CONFIGS[path] = config
+
+    if is_torch_available():
+        # Pay the lazy model imports and the first TorchScript compile up
+        # front rather than inside whichever test happens to run first.
+        from transformers import BartForConditionalGeneration, GPT2LMHeadModel  # noqa: F401
+
+        torch.jit.script(torch.nn.Linear(1, 1))
+
+
+def tearDownModule():
+    _TINY_CONFIGS.clear()
+    shutil.rmtree(_TMP_DIR)
+
+
+def _cached_config(model_id):
+    # hand out copies so a test mutating its config doesn't poison the cache
+    return copy.deepcopy(_TINY_CONFIGS[model_id])
+
+
+def _run(configs=None, **overrides):
+    kwargs = dict(
+        models=[TINY_GPT2_DIR],
+        sequence_lengths=[8],
+        batch_sizes=[1],
+        multi_process=False,
+    )
+    kwargs.update(overrides)
+    benchmark_args = PyTorchBenchmarkArguments(**kwargs)
+    return PyTorchBenchmark(benchmark_args, configs=configs).run()
+
+
+def _run_inference(configs=None, **overrides):
+    # inference_mode only exists from PyTorch 1.9 on
+    inference_mode = getattr(torch, "inference_mode", torch.no_grad)
+    with inference_mode():
+        return _run(configs=configs,
+                    training=False,
+                    inference=True,
+                    **overrides)
+
+
+class BenchmarkCheckMixin:
     def check_results_dict_not_empty(self, results):
         for model_result in results.values():
             for batch_size, sequence_length in zip(model_result["bs"],
@@ -33,216 +119,79 @@ class BenchmarkTest(unittest.TestCase):
                 result = model_result["result"][batch_size][sequence_length]
                 self.assertIsNotNone(result)
 
-    def test_inference_no_configs(self):
-        MODEL_ID = "sshleifer/tiny-gpt2"
-        benchmark_args = PyTorchBenchmarkArguments(
-            models=[MODEL_ID],
-            training=False,
-            inference=True,
-            sequence_lengths=[8],
-            batch_sizes=[1],
-            multi_process=False,
-        )
-        benchmark = PyTorchBenchmark(benchmark_args)
-        results = benchmark.run()
+    def check_inference_results(self, results):
         self.check_results_dict_not_empty(results.time_inference_result)
         self.check_results_dict_not_empty(results.memory_inference_result)
 
+    def check_train_results(self, results):
+        self.check_results_dict_not_empty(results.time_train_result)
+        self.check_results_dict_not_empty(results.memory_train_result)
+
+
+@require_torch
+class BenchmarkTest(BenchmarkCheckMixin, unittest.TestCase):
+    def test_no_configs(self):
+        # a single run covers both the inference and the training benchmark
+        results = _run(training=True, inference=True)
+        self.check_inference_results(results)
+        self.check_train_results(results)
+
+    @slow
     def test_inference_no_configs_only_pretrain(self):
         MODEL_ID = "sshleifer/tiny-distilbert-base-uncased-finetuned-sst-2-english"
-        benchmark_args = PyTorchBenchmarkArguments(
-            models=[MODEL_ID],
-            training=False,
-            inference=True,
-            sequence_lengths=[8],
-            batch_sizes=[1],
-            multi_process=False,
-            only_pretrain_model=True,
-        )
-        benchmark = PyTorchBenchmark(benchmark_args)
-        results = benchmark.run()
-        self.check_results_dict_not_empty(results.time_inference_result)
-        self.check_results_dict_not_empty(results.memory_inference_result)
+        results = _run_inference(models=[MODEL_ID], only_pretrain_model=True)
+        self.check_inference_results(results)
 
     def test_inference_torchscript(self):
-        MODEL_ID = "sshleifer/tiny-gpt2"
-        benchmark_args = PyTorchBenchmarkArguments(
-            models=[MODEL_ID],
-            training=False,
-            inference=True,
-            torchscript=True,
-            sequence_lengths=[8],
-            batch_sizes=[1],
-            multi_process=False,
-        )
-        benchmark = PyTorchBenchmark(benchmark_args)
-        results = benchmark.run()
-        self.check_results_dict_not_empty(results.time_inference_result)
-        self.check_results_dict_not_empty(results.memory_inference_result)
-
-    @unittest.skipIf(torch_device == "cpu", "Cant do half precision")
-    def test_inference_fp16(self):
-        MODEL_ID = "sshleifer/tiny-gpt2"
-        benchmark_args = PyTorchBenchmarkArguments(
-            models=[MODEL_ID],
-            training=False,
-            inference=True,
-            fp16=True,
-            sequence_lengths=[8],
-            batch_sizes=[1],
-            multi_process=False,
-        )
-        benchmark = PyTorchBenchmark(benchmark_args)
-        results = benchmark.run()
-        self.check_results_dict_not_empty(results.time_inference_result)
-        self.check_results_dict_not_empty(results.memory_inference_result)
+        results = _run(training=False, inference=True, torchscript=True)
+        self.check_inference_results(results)
 
     def test_inference_no_model_no_architectures(self):
-        MODEL_ID = "sshleifer/tiny-gpt2"
-        config = AutoConfig.from_pretrained(MODEL_ID)
+        MODEL_ID = TINY_GPT2_DIR
+        config = _cached_config(MODEL_ID)
         # set architectures equal to `None`
         config.architectures = None
-        benchmark_args = PyTorchBenchmarkArguments(
-            models=[MODEL_ID],
-            training=True,
-            inference=True,
-            sequence_lengths=[8],
-            batch_sizes=[1],
-            multi_process=False,
-        )
-        benchmark = PyTorchBenchmark(benchmark_args, configs=[config])
-        results = benchmark.run()
-        self.check_results_dict_not_empty(results.time_inference_result)
-        self.check_results_dict_not_empty(results.memory_inference_result)
-
-    def test_train_no_configs(self):
-        MODEL_ID = "sshleifer/tiny-gpt2"
-        benchmark_args = PyTorchBenchmarkArguments(
-            models=[MODEL_ID],
-            training=True,
-            inference=False,
-            sequence_lengths=[8],
-            batch_sizes=[1],
-            multi_process=False,
-        )
-        benchmark = PyTorchBenchmark(benchmark_args)
-        results = benchmark.run()
-        self.check_results_dict_not_empty(results.time_train_result)
-        self.check_results_dict_not_empty(results.memory_train_result)
-
-    @unittest.skipIf(torch_device == "cpu", "Can't do half precision")
-    def test_train_no_configs_fp16(self):
-        MODEL_ID = "sshleifer/tiny-gpt2"
-        benchmark_args = PyTorchBenchmarkArguments(
+        results = _run(
+            configs=[config],
             models=[MODEL_ID],
             training=True,
-            inference=False,
-            sequence_lengths=[8],
-            batch_sizes=[1],
-            fp16=True,
-            multi_process=False,
-        )
-        benchmark = PyTorchBenchmark(benchmark_args)
-        results = benchmark.run()
-        self.check_results_dict_not_empty(results.time_train_result)
-        self.check_results_dict_not_empty(results.memory_train_result)
-
-    def test_inference_with_configs(self):
-        MODEL_ID = "sshleifer/tiny-gpt2"
-        config = AutoConfig.from_pretrained(MODEL_ID)
-        benchmark_args = PyTorchBenchmarkArguments(
-            models=[MODEL_ID],
-            training=False,
             inference=True,
-            sequence_lengths=[8],
-            batch_sizes=[1],
-            multi_process=False,
         )
-        benchmark = PyTorchBenchmark(benchmark_args, configs=[config])
-        results = benchmark.run()
-        self.check_results_dict_not_empty(results.time_inference_result)
-        self.check_results_dict_not_empty(results.memory_inference_result)
-
-    def test_inference_encoder_decoder_with_configs(self):
-        MODEL_ID = "sshleifer/tinier_bart"
-        config = AutoConfig.from_pretrained(MODEL_ID)
-        benchmark_args = PyTorchBenchmarkArguments(
-            models=[MODEL_ID],
-            training=False,
-            inference=True,
-            sequence_lengths=[8],
-            batch_sizes=[1],
-            multi_process=False,
-        )
-        benchmark = PyTorchBenchmark(benchmark_args, configs=[config])
-        results = benchmark.run()
-        self.check_results_dict_not_empty(results.time_inference_result)
-        self.check_results_dict_not_empty(results.memory_inference_result)
-
-    def test_train_with_configs(self):
-        MODEL_ID = "sshleifer/tiny-gpt2"
-        config = AutoConfig.from_pretrained(MODEL_ID)
-        benchmark_args = PyTorchBenchmarkArguments(
-            models=[MODEL_ID],
-            training=True,
-            inference=False,
-            sequence_lengths=[8],
-            batch_sizes=[1],
-            multi_process=False,
-        )
-        benchmark = PyTorchBenchmark(benchmark_args, configs=[config])
-        results = benchmark.run()
-        self.check_results_dict_not_empty(results.time_train_result)
-        self.check_results_dict_not_empty(results.memory_train_result)
-
-    def test_train_encoder_decoder_with_configs(self):
-        MODEL_ID = "sshleifer/tinier_bart"
-        config = AutoConfig.from_pretrained(MODEL_ID)
-        benchmark_args = PyTorchBenchmarkArguments(
-            models=[MODEL_ID],
-            training=True,
-            inference=True,
-            sequence_lengths=[8],
-            batch_sizes=[1],
-            multi_process=False,
-        )
-        benchmark = PyTorchBenchmark(benchmark_args, configs=[config])
-        results = benchmark.run()
-        self.check_results_dict_not_empty(results.time_train_result)
-        self.check_results_dict_not_empty(results.memory_train_result)
+        self.check_inference_results(results)
+
+    def test_with_configs(self):
+        for MODEL_ID in (TINY_GPT2_DIR, TINIER_BART_DIR):
+            with self.subTest(model=MODEL_ID):
+                config = _cached_config(MODEL_ID)
+                results = _run(
+                    configs=[config],
+                    models=[MODEL_ID],
+                    training=True,
+                    inference=True,
+                )
+                self.check_inference_results(results)
+                self.check_train_results(results)
 
     def test_save_csv_files(self):
-        MODEL_ID = "sshleifer/tiny-gpt2"
-        with tempfile.TemporaryDirectory() as tmp_dir:
-            benchmark_args = PyTorchBenchmarkArguments(
-                models=[MODEL_ID],
-                training=True,
-                inference=True,
-                save_to_csv=True,
-                sequence_lengths=[8],
-                batch_sizes=[1],
-                inference_time_csv_file=os.path.join(tmp_dir, "inf_time.csv"),
-                train_memory_csv_file=os.path.join(tmp_dir, "train_mem.csv"),
-                inference_memory_csv_file=os.path.join(tmp_dir, "inf_mem.csv"),
-                train_time_csv_file=os.path.join(tmp_dir, "train_time.csv"),
-                env_info_csv_file=os.path.join(tmp_dir, "env.csv"),
-                multi_process=False,
-            )
-            benchmark = PyTorchBenchmark(benchmark_args)
-            benchmark.run()
-            self.assertTrue(
-                Path(os.path.join(tmp_dir, "inf_time.csv")).exists())
-            self.assertTrue(
-                Path(os.path.join(tmp_dir, "train_time.csv")).exists())
-            self.assertTrue(
-                Path(os.path.join(tmp_dir, "inf_mem.csv")).exists())
-            self.assertTrue(
-                Path(os.path.join(tmp_dir, "train_mem.csv")).exists())
-            self.assertTrue(Path(os.path.join(tmp_dir, "env.csv")).exists())
+        csv_files = {
+            "inference_time_csv_file": "inf_time.csv",
+            "train_memory_csv_file": "train_mem.csv",
+            "inference_memory_csv_file": "inf_mem.csv",
+            "train_time_csv_file": "train_time.csv",
+            "env_info_csv_file": "env.csv",
+        }
+        # the csv files are only checked for being written, keep them off disk
+        with mock.patch("transformers.benchmark.benchmark_utils.open",
+                        mock.mock_open(),
+                        create=True) as mocked_open:
+            _run(training=True, inference=True, save_to_csv=True, **csv_files)
+        opened_paths = [
+            call.args[0] for call in mocked_open.call_args_list
+            if call.kwargs.get("mode") == "w"
+        ]
+        self.assertEqual(sorted(opened_paths), sorted(csv_files.values()))
 
     def test_trace_memory(self):
-        MODEL_ID = "sshleifer/tiny-gpt2"
-
         def _check_summary_is_not_empty(summary):
             self.assertTrue(hasattr(summary, "sequential"))
             self.assertTrue(hasattr(summary, "cumulative"))
@@ -250,19 +199,26 @@ class BenchmarkTest(unittest.TestCase):
             self.assertTrue(hasattr(summary, "total"))
 
         with tempfile.TemporaryDirectory() as tmp_dir:
-            benchmark_args = PyTorchBenchmarkArguments(
-                models=[MODEL_ID],
+            log_path = Path(tmp_dir, "log.txt")
+            result = _run(
                 training=True,
                 inference=True,
-                sequence_lengths=[8],
-                batch_sizes=[1],
-                log_filename=os.path.join(tmp_dir, "log.txt"),
+                log_filename=str(log_path),
                 log_print=True,
                 trace_memory_line_by_line=True,
-                multi_process=False,
             )
-            benchmark = PyTorchBenchmark(benchmark_args)
-            result = benchmark.run()
             _check_summary_is_not_empty(result.inference_summary)
             _check_summary_is_not_empty(result.train_summary)
-            self.assertTrue(Path(os.path.join(tmp_dir, "log.txt")).exists())
+            self.assertTrue(log_path.exists())
+
+
+@require_torch
+@require_torch_gpu
+class BenchmarkTestGPU(BenchmarkCheckMixin, unittest.TestCase):
+    def test_fp16_variants(self):
+        with self.subTest(training=False, inference=True):
+            results = _run_inference(fp16=True)
+            self.check_inference_results(results)
+        with self.subTest(training=True, inference=False):
+            results = _run(training=True, inference=False, fp16=True)
+            self.check_train_results(results)
@@ -34,16 +34,20 @@ if is_torch_available():
 
 @require_torch
 class DataCollatorIntegrationTest(unittest.TestCase):
-    def setUp(self):
-        self.tmpdirname = tempfile.mkdtemp()
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdirname = tempfile.mkdtemp()
 
         vocab_tokens = ["[UNK]", "[CLS]", "[SEP]", "[PAD]", "[MASK]"]
-        self.vocab_file = os.path.join(self.tmpdirname, "vocab.txt")
-        with open(self.vocab_file, "w", encoding="utf-8") as vocab_writer:
-            vocab_writer.write("".join([x + "\n" for x in vocab_tokens]))
+        cls.vocab_file = os.path.join(cls.tmpdirname, "vocab.txt")
+        with open(cls.vocab_file, "w", encoding="utf-8") as vocab_writer:
+            vocab_writer.write("\n".join(vocab_tokens))
+            vocab_writer.write("\n")
+        cls.tokenizer = BertTokenizer(cls.vocab_file)
 
-    def tearDown(self):
-        shutil.rmtree(self.tmpdirname)
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmpdirname)
 
     def test_default_with_dict(self):
         features = [{
@@ -51,9 +55,9 @@ class DataCollatorIntegrationTest(unittest.TestCase):
             "inputs": [0, 1, 2, 3, 4, 5]
         } for i in range(8)]
         batch = default_data_collator(features)
-        self.assertTrue(batch["labels"].equal(torch.tensor(list(range(8)))))
+        self.assertTrue(batch["labels"].equal(torch.arange(8)))
         self.assertEqual(batch["labels"].dtype, torch.long)
-        self.assertEqual(batch["inputs"].shape, torch.Size([8, 6]))
+        self.assertEqual(batch["inputs"].shape, (8, 6))
 
         # With label_ids
         features = [{
@@ -61,30 +65,30 @@ class DataCollatorIntegrationTest(unittest.TestCase):
             "inputs": [0, 1, 2, 3, 4, 5]
         } for i in range(8)]
         batch = default_data_collator(features)
-        self.assertTrue(batch["labels"].equal(torch.tensor([[0, 1, 2]] * 8)))
+        self.assertTrue(batch["labels"].equal(
+            torch.arange(3).unsqueeze(0).expand(8, 3).contiguous()))
         self.assertEqual(batch["labels"].dtype, torch.long)
-        self.assertEqual(batch["inputs"].shape, torch.Size([8, 6]))
+        self.assertEqual(batch["inputs"].shape, (8, 6))
 
         # Features can already be tensors
-        features = [{
-            "label": i,
-            "inputs": torch.randint(10, [10])
-        } for i in range(8)]
+        ids = torch.randint(10, (8, 10))
+        features = [{"label": i, "inputs": ids[i]} for i in range(8)]
         batch = default_data_collator(features)
-        self.assertTrue(batch["labels"].equal(torch.tensor(list(range(8)))))
+        self.assertTrue(batch["labels"].equal(torch.arange(8)))
         self.assertEqual(batch["labels"].dtype, torch.long)
-        self.assertEqual(batch["inputs"].shape, torch.Size([8, 10]))
+        self.assertEqual(batch["inputs"].shape, (8, 10))
 
         # Labels can already be tensors
+        ids = torch.randint(10, (8, 10))
         features = [{
             "label": torch.tensor(i),
-            "inputs": torch.randint(10, [10])
+            "inputs": ids[i]
         } for i in range(8)]
         batch = default_data_collator(features)
         self.assertEqual(batch["labels"].dtype, torch.long)
-        self.assertTrue(batch["labels"].equal(torch.tensor(list(range(8)))))
+        self.assertTrue(batch["labels"].equal(torch.arange(8)))
         self.assertEqual(batch["labels"].dtype, torch.long)
-        self.assertEqual(batch["inputs"].shape, torch.Size([8, 10]))
+        self.assertEqual(batch["inputs"].shape, (8, 10))
 
     def test_default_classification_and_regression(self):
         data_collator = default_data_collator
@@ -110,7 +114,7 @@ class DataCollatorIntegrationTest(unittest.TestCase):
         } for i in range(8)]
         batch = default_data_collator(features)
         self.assertTrue("labels" not in batch)
-        self.assertEqual(batch["inputs"].shape, torch.Size([8, 6]))
+        self.assertEqual(batch["inputs"].shape, (8, 6))
 
         # With label_ids
         features = [{
@@ -119,10 +123,10 @@ class DataCollatorIntegrationTest(unittest.TestCase):
         } for i in range(8)]
         batch = default_data_collator(features)
         self.assertTrue("labels" not in batch)
-        self.assertEqual(batch["inputs"].shape, torch.Size([8, 6]))
+        self.assertEqual(batch["inputs"].shape, (8, 6))
 
     def test_data_collator_with_padding(self):
-        tokenizer = BertTokenizer(self.vocab_file)
+        tokenizer = self.tokenizer
         features = [{
             "input_ids": [0, 1, 2]
         }, {
@@ -131,7 +135,7 @@ class DataCollatorIntegrationTest(unittest.TestCase):
 
         data_collator = DataCollatorWithPadding(tokenizer)
         batch = data_collator(features)
-        self.assertEqual(batch["input_ids"].shape, torch.Size([2, 6]))
+        self.assertEqual(batch["input_ids"].shape, (2, 6))
         self.assertEqual(batch["input_ids"][0].tolist(),
                          [0, 1, 2] + [tokenizer.pad_token_id] * 3)
 
@@ -139,15 +143,15 @@ class DataCollatorIntegrationTest(unittest.TestCase):
                                                 padding="max_length",
                                                 max_length=10)
         batch = data_collator(features)
-        self.assertEqual(batch["input_ids"].shape, torch.Size([2, 10]))
+        self.assertEqual(batch["input_ids"].shape, (2, 10))
 
         data_collator = DataCollatorWithPadding(tokenizer,
                                                 pad_to_multiple_of=8)
         batch = data_collator(features)
-        self.assertEqual(batch["input_ids"].shape, torch.Size([2, 8]))
+        self.assertEqual(batch["input_ids"].shape, (2, 8))
 
     def test_data_collator_for_token_classification(self):
-        tokenizer = BertTokenizer(self.vocab_file)
+        tokenizer = self.tokenizer
         features = [
             {
                 "input_ids": [0, 1, 2],
@@ -161,41 +165,42 @@ class DataCollatorIntegrationTest(unittest.TestCase):
 
         data_collator = DataCollatorForTokenClassification(tokenizer)
         batch = data_collator(features)
-        self.assertEqual(batch["input_ids"].shape, torch.Size([2, 6]))
+        self.assertEqual(batch["input_ids"].shape, (2, 6))
         self.assertEqual(batch["input_ids"][0].tolist(),
                          [0, 1, 2] + [tokenizer.pad_token_id] * 3)
-        self.assertEqual(batch["labels"].shape, torch.Size([2, 6]))
+        self.assertEqual(batch["labels"].shape, (2, 6))
         self.assertEqual(batch["labels"][0].tolist(), [0, 1, 2] + [-100] * 3)
 
         data_collator = DataCollatorForTokenClassification(
             tokenizer, padding="max_length", max_length=10)
         batch = data_collator(features)
-        self.assertEqual(batch["input_ids"].shape, torch.Size([2, 10]))
-        self.assertEqual(batch["labels"].shape, torch.Size([2, 10]))
+        self.assertEqual(batch["input_ids"].shape, (2, 10))
+        self.assertEqual(batch["labels"].shape, (2, 10))
 
         data_collator = DataCollatorForTokenClassification(
             tokenizer, pad_to_multiple_of=8)
         batch = data_collator(features)
-        self.assertEqual(batch["input_ids"].shape, torch.Size([2, 8]))
-        self.assertEqual(batch["labels"].shape, torch.Size([2, 8]))
+        self.assertEqual(batch["input_ids"].shape, (2, 8))
+        self.assertEqual(batch["labels"].shape, (2, 8))
 
         data_collator = DataCollatorForTokenClassification(
             tokenizer, label_pad_token_id=-1)
         batch = data_collator(features)
-        self.assertEqual(batch["input_ids"].shape, torch.Size([2, 6]))
+        self.assertEqual(batch["input_ids"].shape, (2, 6))
         self.assertEqual(batch["input_ids"][0].tolist(),
                          [0, 1, 2] + [tokenizer.pad_token_id] * 3)
-        self.assertEqual(batch["labels"].shape, torch.Size([2, 6]))
+        self.assertEqual(batch["labels"].shape, (2, 6))
         self.assertEqual(batch["labels"][0].tolist(), [0, 1, 2] + [-1] * 3)
 
     def test_data_collator_for_language_modeling(self):
-        tokenizer = BertTokenizer(self.vocab_file)
+        tokenizer = self.tokenizer
+        _ids = list(range(10))
         no_pad_features = [
             {
-                "input_ids": list(range(10))
+                "input_ids": _ids
             },
             {
-                "input_ids": list(range(10))
+                "input_ids": _ids
             },
         ]
         pad_features = [{
@@ -206,25 +211,27 @@ class DataCollatorIntegrationTest(unittest.TestCase):
 
         data_collator = DataCollatorForLanguageModeling(tokenizer, mlm=False)
         batch = data_collator(no_pad_features)
-        self.assertEqual(batch["input_ids"].shape, torch.Size((2, 10)))
-        self.assertEqual(batch["labels"].shape, torch.Size((2, 10)))
+        self.assertEqual(batch["input_ids"].shape, (2, 10))
+        self.assertEqual(batch["labels"].shape, (2, 10))
 
         batch = data_collator(pad_features)
-        self.assertEqual(batch["input_ids"].shape, torch.Size((2, 10)))
-        self.assertEqual(batch["labels"].shape, torch.Size((2, 10)))
-
-        tokenizer._pad_token = None
-        data_collator = DataCollatorForLanguageModeling(tokenizer, mlm=False)
+        self.assertEqual(batch["input_ids"].shape, (2, 10))
+        self.assertEqual(batch["labels"].shape, (2, 10))
+
+        # Use a fresh tokenizer so the shared one keeps its padding token
+        no_pad_tokenizer = BertTokenizer(self.vocab_file)
+        no_pad_tokenizer._pad_token = None
+        data_collator = DataCollatorForLanguageModeling(no_pad_tokenizer,
+                                                        mlm=False)
         with self.assertRaises(ValueError):
             # Expect error due to padding token missing
             data_collator(pad_features)
 
         set_seed(42)  # For reproducibility
-        tokenizer = BertTokenizer(self.vocab_file)
         data_collator = DataCollatorForLanguageModeling(tokenizer)
         batch = data_collator(no_pad_features)
-        self.assertEqual(batch["input_ids"].shape, torch.Size((2, 10)))
-        self.assertEqual(batch["labels"].shape, torch.Size((2, 10)))
+        self.assertEqual(batch["input_ids"].shape, (2, 10))
+        self.assertEqual(batch["labels"].shape, (2, 10))
 
         masked_tokens = batch["input_ids"] == tokenizer.mask_token_id
         self.assertTrue(torch.any(masked_tokens))
@@ -232,8 +239,8 @@ class DataCollatorIntegrationTest(unittest.TestCase):
             all(x == -100 for x in batch["labels"][~masked_tokens].tolist()))
 
         batch = data_collator(pad_features)
-        self.assertEqual(batch["input_ids"].shape, torch.Size((2, 10)))
-        self.assertEqual(batch["labels"].shape, torch.Size((2, 10)))
+        self.assertEqual(batch["input_ids"].shape, (2, 10))
+        self.assertEqual(batch["labels"].shape, (2, 10))
 
         masked_tokens = batch["input_ids"] == tokenizer.mask_token_id
         self.assertTrue(torch.any(masked_tokens))
@@ -241,13 +248,14 @@ class DataCollatorIntegrationTest(unittest.TestCase):
             all(x == -100 for x in batch["labels"][~masked_tokens].tolist()))
 
     def test_plm(self):
-        tokenizer = BertTokenizer(self.vocab_file)
+        tokenizer = self.tokenizer
+        _ids = list(range(10))
         no_pad_features = [
             {
-                "input_ids": list(range(10))
+                "input_ids": _ids
             },
             {
-                "input_ids": list(range(10))
+                "input_ids": _ids
             },
         ]
         pad_features = [{
@@ -260,19 +268,17 @@ class DataCollatorIntegrationTest(unittest.TestCase):
 
         batch = data_collator(pad_features)
         self.assertIsInstance(batch, dict)
-        self.assertEqual(batch["input_ids"].shape, torch.Size((2, 10)))
-        self.assertEqual(batch["perm_mask"].shape, torch.Size((2, 10, 10)))
-        self.assertEqual(batch["target_mapping"].shape, torch.Size(
-            (2, 10, 10)))
-        self.assertEqual(batch["labels"].shape, torch.Size((2, 10)))
+        self.assertEqual(batch["input_ids"].shape, (2, 10))
+        self.assertEqual(batch["perm_mask"].shape, (2, 10, 10))
+        self.assertEqual(batch["target_mapping"].shape, (2, 10, 10))
+        self.assertEqual(batch["labels"].shape, (2, 10))
 
         batch = data_collator(no_pad_features)
         self.assertIsInstance(batch, dict)
-        self.assertEqual(batch["input_ids"].shape, torch.Size((2, 10)))
-        self.assertEqual(batch["perm_mask"].shape, torch.Size((2, 10, 10)))
-        self.assertEqual(batch["target_mapping"].shape, torch.Size(
-            (2, 10, 10)))
-        self.assertEqual(batch["labels"].shape, torch.Size((2, 10)))
+        self.assertEqual(batch["input_ids"].shape, (2, 10))
+        self.assertEqual(batch["perm_mask"].shape, (2, 10, 10))
+        self.assertEqual(batch["target_mapping"].shape, (2, 10, 10))
+        self.assertEqual(batch["labels"].shape, (2, 10))
 
         example = [torch.randint(5, [5])]
         with self.assertRaises(ValueError):
@@ -280,32 +286,34 @@ class DataCollatorIntegrationTest(unittest.TestCase):
             data_collator(example)
 
     def test_nsp(self):
-        tokenizer = BertTokenizer(self.vocab_file)
+        tokenizer = self.tokenizer
+        _ids = [0, 1, 2, 3, 4]
         features = [{
-            "input_ids": [0, 1, 2, 3, 4],
-            "token_type_ids": [0, 1, 2, 3, 4],
+            "input_ids": _ids,
+            "token_type_ids": _ids,
             "next_sentence_label": i,
         } for i in range(2)]
         data_collator = DataCollatorForLanguageModeling(tokenizer)
         batch = data_collator(features)
 
-        self.assertEqual(batch["input_ids"].shape, torch.Size((2, 5)))
-        self.assertEqual(batch["token_type_ids"].shape, torch.Size((2, 5)))
-        self.assertEqual(batch["labels"].shape, torch.Size((2, 5)))
-        self.assertEqual(batch["next_sentence_label"].shape, torch.Size((2, )))
+        self.assertEqual(batch["input_ids"].shape, (2, 5))
+        self.assertEqual(batch["token_type_ids"].shape, (2, 5))
+        self.assertEqual(batch["labels"].shape, (2, 5))
+        self.assertEqual(batch["next_sentence_label"].shape, (2, ))
 
     def test_sop(self):
-        tokenizer = BertTokenizer(self.vocab_file)
+        tokenizer = self.tokenizer
+        # sharing one tensor is fine, the collator stacks into a new batch
+        _ids = torch.tensor([0, 1, 2, 3, 4])
         features = [{
-            "input_ids": torch.tensor([0, 1, 2, 3, 4]),
-            "token_type_ids": torch.tensor([0, 1, 2, 3, 4]),
+            "input_ids": _ids,
+            "token_type_ids": _ids,
             "sentence_order_label": i,
         } for i in range(2)]
         data_collator = DataCollatorForLanguageModeling(tokenizer)
         batch = data_collator(features)
 
-        self.assertEqual(batch["input_ids"].shape, torch.Size((2, 5)))
-        self.assertEqual(batch["token_type_ids"].shape, torch.Size((2, 5)))
-        self.assertEqual(batch["labels"].shape, torch.Size((2, 5)))
-        self.assertEqual(batch["sentence_order_label"].shape, torch.Size(
-            (2, )))
+        self.assertEqual(batch["input_ids"].shape, (2, 5))
+        self.assertEqual(batch["token_type_ids"].shape, (2, 5))
+        self.assertEqual(batch["labels"].shape, (2, 5))
+        self.assertEqual(batch["sentence_order_label"].shape, (2, ))
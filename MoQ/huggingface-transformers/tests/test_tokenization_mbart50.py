@@ -13,6 +13,7 @@
 # limitations under the License.
 
 import os
+import shutil
 import tempfile
 import unittest
 
@@ -50,91 +51,97 @@ class MBartTokenizationTest(TokenizerTesterMixin, unittest.TestCase):
     rust_tokenizer_class = MBart50TokenizerFast
     test_rust_tokenizer = True
 
-    def setUp(self):
-        super().setUp()
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
 
-        # We have a SentencePiece fixture for testing
+        # We have a SentencePiece fixture for testing, save it once per class
+        # and copy the files into each test's tmpdirname.
+        cls.saved_tokenizer_dir = tempfile.mkdtemp()
         tokenizer = MBart50Tokenizer(SAMPLE_VOCAB,
                                      src_lang="en_XX",
                                      tgt_lang="ro_RO",
                                      keep_accents=True)
-        tokenizer.save_pretrained(self.tmpdirname)
+        tokenizer.save_pretrained(cls.saved_tokenizer_dir)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.saved_tokenizer_dir)
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+
+        for file_name in os.listdir(self.saved_tokenizer_dir):
+            shutil.copy(os.path.join(self.saved_tokenizer_dir, file_name),
+                        self.tmpdirname)
 
     def test_full_tokenizer(self):
-        tokenizer = MBart50Tokenizer(SAMPLE_VOCAB,
-                                     src_lang="en_XX",
-                                     tgt_lang="ro_RO",
-                                     keep_accents=True)
+        slow_tokenizer = MBart50Tokenizer(SAMPLE_VOCAB,
+                                          src_lang="en_XX",
+                                          tgt_lang="ro_RO",
+                                          keep_accents=True)
+        fast_tokenizer = MBart50TokenizerFast(SAMPLE_VOCAB,
+                                              src_lang="en_XX",
+                                              tgt_lang="ro_RO",
+                                              keep_accents=True)
+        fairseq_offset = slow_tokenizer.fairseq_offset
 
-        tokens = tokenizer.tokenize("This is a test")
-        self.assertListEqual(tokens, ["▁This", "▁is", "▁a", "▁t", "est"])
+        # the fast tokenizer is the main path, the slow one checks parity
+        for tokenizer in (fast_tokenizer, slow_tokenizer):
+            with self.subTest(tokenizer=tokenizer.__class__.__name__):
+                tokens = tokenizer.tokenize("This is a test")
+                self.assertListEqual(tokens,
+                                     ["▁This", "▁is", "▁a", "▁t", "est"])
 
-        self.assertListEqual(
-            tokenizer.convert_tokens_to_ids(tokens),
-            [
-                value + tokenizer.fairseq_offset
-                for value in [285, 46, 10, 170, 382]
-            ],
-        )
+                self.assertListEqual(
+                    tokenizer.convert_tokens_to_ids(tokens),
+                    [
+                        value + fairseq_offset
+                        for value in [285, 46, 10, 170, 382]
+                    ],
+                )
 
-        tokens = tokenizer.tokenize("I was born in 92000, and this is falsé.")
-        self.assertListEqual(
-            tokens,
-            # fmt: off
-            [
-                SPIECE_UNDERLINE + "I", SPIECE_UNDERLINE + "was",
-                SPIECE_UNDERLINE + "b", "or", "n", SPIECE_UNDERLINE + "in",
-                SPIECE_UNDERLINE + "", "9", "2", "0", "0", "0", ",",
-                SPIECE_UNDERLINE + "and", SPIECE_UNDERLINE + "this",
-                SPIECE_UNDERLINE + "is", SPIECE_UNDERLINE + "f", "al", "s",
-                "é", "."
-            ],
-            # fmt: on
-        )
-        ids = tokenizer.convert_tokens_to_ids(tokens)
-        self.assertListEqual(
-            ids,
-            [
-                value + tokenizer.fairseq_offset for value in [
-                    8,
-                    21,
-                    84,
-                    55,
-                    24,
-                    19,
-                    7,
-                    2,
-                    602,
-                    347,
-                    347,
-                    347,
-                    3,
-                    12,
-                    66,
-                    46,
-                    72,
-                    80,
-                    6,
-                    2,
-                    4,
-                ]
-            ],
-        )
+                tokens = tokenizer.tokenize(
+                    "I was born in 92000, and this is falsé.")
+                self.assertListEqual(
+                    tokens,
+                    # fmt: off
+                    [
+                        SPIECE_UNDERLINE + "I", SPIECE_UNDERLINE + "was",
+                        SPIECE_UNDERLINE + "b", "or", "n",
+                        SPIECE_UNDERLINE + "in", SPIECE_UNDERLINE + "", "9",
+                        "2", "0", "0", "0", ",", SPIECE_UNDERLINE + "and",
+                        SPIECE_UNDERLINE + "this", SPIECE_UNDERLINE + "is",
+                        SPIECE_UNDERLINE + "f", "al", "s", "é", "."
+                    ],
+                    # fmt: on
+                )
+                ids = tokenizer.convert_tokens_to_ids(tokens)
+                self.assertListEqual(
+                    ids,
+                    [
+                        value + fairseq_offset for value in [
+                            8, 21, 84, 55, 24, 19, 7, 2, 602, 347, 347, 347, 3,
+                            12, 66, 46, 72, 80, 6, 2, 4
+                        ]
+                    ],
+                )
 
-        back_tokens = tokenizer.convert_ids_to_tokens(ids)
-        self.assertListEqual(
-            back_tokens,
-            # fmt: off
-            [
-                SPIECE_UNDERLINE + "I", SPIECE_UNDERLINE + "was",
-                SPIECE_UNDERLINE + "b", "or", "n", SPIECE_UNDERLINE + "in",
-                SPIECE_UNDERLINE + "", "<unk>", "2", "0", "0", "0", ",",
-                SPIECE_UNDERLINE + "and", SPIECE_UNDERLINE + "this",
-                SPIECE_UNDERLINE + "is", SPIECE_UNDERLINE + "f", "al", "s",
-                "<unk>", "."
-            ],
-            # fmt: on
-        )
+                back_tokens = tokenizer.convert_ids_to_tokens(ids)
+                self.assertListEqual(
+                    back_tokens,
+                    # fmt: off
+                    [
+                        SPIECE_UNDERLINE + "I", SPIECE_UNDERLINE + "was",
+                        SPIECE_UNDERLINE + "b", "or", "n", SPIECE_UNDERLINE +
+                        "in", SPIECE_UNDERLINE + "", "<unk>", "2", "0", "0",
+                        "0", ",", SPIECE_UNDERLINE + "and",
+                        SPIECE_UNDERLINE + "this", SPIECE_UNDERLINE + "is",
+                        SPIECE_UNDERLINE + "f", "al", "s", "<unk>", "."
+                    ],
+                    # fmt: on
+                )
 
 
 @require_torch
@@ -181,7 +188,11 @@ class MBartOneToManyIntegrationTest(unittest.TestCase):
         self.assertEqual(self.tokenizer.fairseq_tokens_to_ids["mr_IN"], 250038)
 
     def test_tokenizer_batch_encode_plus(self):
-        ids = self.tokenizer.batch_encode_plus(self.src_text).input_ids[0]
+        batch = self.tokenizer.batch_encode_plus(self.src_text,
+                                                 return_tensors="pt",
+                                                 padding="longest")
+        # the first sentence is the shorter one, drop its padding
+        ids = batch.input_ids[0][batch.attention_mask[0].bool()].tolist()
         self.assertListEqual(self.expected_src_tokens, ids)
 
     def test_tokenizer_decode_ignores_language_codes(self):
@@ -196,9 +207,12 @@ class MBartOneToManyIntegrationTest(unittest.TestCase):
         self.assertNotIn(self.tokenizer.eos_token, result)
 
     def test_tokenizer_truncation(self):
-        src_text = ["this is gunna be a long sentence " * 20]
+        src_text = ["this is gunna be a long sentence " * 2]
         assert isinstance(src_text[0], str)
         desired_max_length = 10
+        # still long enough to be truncated
+        self.assertGreater(len(self.tokenizer.tokenize(src_text[0])),
+                           desired_max_length)
         ids = self.tokenizer.prepare_seq2seq_batch(
             src_text,
             max_length=desired_max_length,
@@ -229,16 +243,12 @@ class MBartOneToManyIntegrationTest(unittest.TestCase):
         batch["decoder_input_ids"] = shift_tokens_right(
             batch.labels, self.tokenizer.pad_token_id)
 
-        for k in batch:
-            batch[k] = batch[k].tolist()
-        # batch = {k: v.tolist() for k,v in batch.items()}
         # fairseq batch: https://gist.github.com/sshleifer/cba08bc2109361a74ac3760a7e30e4f4
-        # batch.decoder_inputs_ids[0][0] ==
-        assert batch.input_ids[1][0] == EN_CODE
-        assert batch.input_ids[1][-1] == 2
-        assert batch.labels[1][0] == RO_CODE
-        assert batch.labels[1][-1] == 2
-        assert batch.decoder_input_ids[1][:2] == [2, RO_CODE]
+        assert batch.input_ids[1, 0].item() == EN_CODE
+        assert batch.input_ids[1, -1].item() == 2
+        assert batch.labels[1, 0].item() == RO_CODE
+        assert batch.labels[1, -1].item() == 2
+        assert batch.decoder_input_ids[1, :2].tolist() == [2, RO_CODE]
 
     @require_torch
     def test_tokenizer_prepare_seq2seq_batch(self):
@@ -851,6 +851,12 @@ def _add_mixed_precision_args(parser):
         help="Move the cross entropy unreduced loss calculation"
         "for lm head to fp16.",
     )
+    group.add_argument(
+        "--use-torch-compile",
+        action="store_true",
+        help="Compile the fp32 <-> fp16/bf16 casts around the model "
+        "with torch.compile. Ignored if torch.compile is not available.",
+    )
 
     return parser
 
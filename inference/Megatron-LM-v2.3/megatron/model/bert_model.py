@@ -164,7 +164,7 @@ class BertModel(MegatronModule):
             post_process=self.post_process,
         )
 
-        self.initialize_word_embeddings(init_method_normal)
+        self.initialize_word_embeddings()
         if self.post_process:
             self.lm_head = BertLMHead(
                 self.word_embeddings_weight().size(0),
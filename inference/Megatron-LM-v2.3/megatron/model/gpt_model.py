@@ -86,7 +86,7 @@ class GPTModel(MegatronModule):
             post_process=self.post_process,
         )
 
-        self.initialize_word_embeddings(init_method_normal)
+        self.initialize_word_embeddings()
 
     def set_input_tensor(self, input_tensor):
         """See megatron.model.transformer.set_input_tensor()"""
@@ -14,20 +14,37 @@
 # limitations under the License.
 """Megatron Module"""
 
+import collections
+import functools
+
 import torch
-from torch.autograd import Variable
-from torch.nn.parameter import Parameter
+
+try:
+    from torch.utils._pytree import tree_map
+except ImportError:
+    # Older torch, fall back to walking nested containers ourselves.
+    tree_map = None
 
 from megatron import get_args
 from megatron import mpu
 
-_FLOAT_TYPES = (torch.FloatTensor, torch.cuda.FloatTensor)
-_HALF_TYPES = (torch.HalfTensor, torch.cuda.HalfTensor)
-_BF16_TYPES = (torch.BFloat16Tensor, torch.cuda.BFloat16Tensor)
+_FP16_DTYPES = frozenset({torch.float16, torch.bfloat16})
+_TENSOR = torch.Tensor
+# Container types conversion_helper() descends into, besides namedtuples.
+_CONTAINER_TYPES = frozenset({tuple, list, dict, collections.OrderedDict})
+
+# Every parameter is unshared unless flagged otherwise on the instance, see
+# initialize_word_embeddings().
+torch.nn.parameter.Parameter.shared = False
+
+# Number of pieces the word embeddings sync all-reduce is split into.
+_EMBEDDING_SYNC_CHUNKS = 8
+# Byte budget of a single batched copy in _bulk_cast().
+_BULK_CAST_BUCKET_BYTES = 64 * 1024 * 1024
 
 
 def param_is_not_shared(param):
-    return not hasattr(param, "shared") or not param.shared
+    return not param.shared
 
 
 class MegatronModule(torch.nn.Module):
@@ -56,7 +73,7 @@ class MegatronModule(torch.nn.Module):
         raise Exception("word_embeddings_weight() should be "
                         "called for first and last stage only")
 
-    def initialize_word_embeddings(self, init_method_normal):
+    def initialize_word_embeddings(self):
         args = get_args()
         if not self.share_word_embeddings:
             raise Exception("initialize_word_embeddings() was called but "
@@ -84,22 +101,32 @@ class MegatronModule(torch.nn.Module):
             assert not mpu.is_pipeline_first_stage()
             self._word_embeddings_for_head_key = "word_embeddings_for_head"
             # set word_embeddings weights to 0 here, then copy first
-            # stage's weights using all_reduce below.
+            # stage's weights using all_reduce below. The embedding is built
+            # without any init and only this rank's partition is zeroed.
             self.word_embeddings = mpu.VocabParallelEmbedding(
                 args.padded_vocab_size,
                 args.hidden_size,
-                init_method=init_method_normal(args.init_method_std),
+                init_method=lambda tensor: tensor,
             )
-            self.word_embeddings.weight.data.fill_(0)
+            self.word_embeddings.weight.data.zero_()
             self.word_embeddings.weight.shared = True
 
         # Ensure that first and last stages have the same initial parameter
         # values.
         if torch.distributed.is_initialized():
             if mpu.is_pipeline_first_stage() or mpu.is_pipeline_last_stage():
-                torch.distributed.all_reduce(
-                    self.word_embeddings_weight().data,
-                    group=mpu.get_embedding_group())
+                # Reduce the flattened weight as several async all-reduces
+                # over equal chunks, then wait for all of them.
+                weight = self.word_embeddings_weight().data.view(-1)
+                handles = [
+                    torch.distributed.all_reduce(
+                        chunk, group=mpu.get_embedding_group(), async_op=True)
+                    for chunk in weight.chunk(_EMBEDDING_SYNC_CHUNKS)
+                ]
+                # Block until the sync is done, nothing may read the
+                # embeddings while NCCL is still writing them.
+                for handle in handles:
+                    handle.wait()
         else:
             print("WARNING! Distributed processes aren't initialized, so "
                   "word embeddings in the last layer are not initialized. "
@@ -108,41 +135,148 @@ class MegatronModule(torch.nn.Module):
                   "something is definitely wrong.")
 
 
+def _half_conversion(val, float16_convertor):
+    if isinstance(val, _TENSOR) and val.dtype is torch.float32:
+        val = float16_convertor(val)
+    return val
+
+
+def _float_conversion(val):
+    if isinstance(val, _TENSOR) and val.dtype in _FP16_DTYPES:
+        val = val.float()
+    return val
+
+
+def _is_container(val):
+    """Whether pytree's tree_map would descend into `val`: exact tuples,
+    lists, dicts and OrderedDicts, and namedtuples."""
+    return type(val) in _CONTAINER_TYPES or (isinstance(val, tuple)
+                                             and hasattr(val, "_fields"))
+
+
+def _rebuild(node, children):
+    """Rebuild container `node` of the same type around `children`."""
+    if isinstance(node, dict):
+        return type(node)(zip(node.keys(), children))
+    if type(node) is list:
+        return children
+    if type(node) is tuple:
+        return tuple(children)
+    # namedtuple
+    return type(node)(*children)
+
+
 def conversion_helper(val, conversion):
-    """Apply conversion to val. Recursively apply conversion if `val`
-    #is a nested tuple/list structure."""
-    if not isinstance(val, (tuple, list)):
+    """Apply conversion to val. Iteratively apply conversion to the leaves
+    of `val` if it is a nested tuple/list/dict/namedtuple structure, the
+    same containers tree_map covers. Only used when torch has no pytree
+    tree_map."""
+    if type(val) is _TENSOR or not _is_container(val):
         return conversion(val)
-    rtn = [conversion_helper(v, conversion) for v in val]
-    if isinstance(val, tuple):
-        rtn = tuple(rtn)
-    return rtn
+
+    # Fast path: a flat tuple/list of leaves, the common forward case.
+    if type(val) in (tuple, list) and not any(_is_container(v) for v in val):
+        rtn = [conversion(v) for v in val]
+        if type(val) is tuple:
+            rtn = tuple(rtn)
+        return rtn
+
+    # Walk the nesting with an explicit stack, replacing every container
+    # by a list of its children (dict values) in place and remembering
+    # the original so it can be rebuilt with the same type and keys.
+    holder = [val]
+    stack = [(holder, 0)]
+    containers = []
+    while stack:
+        parent, index = stack.pop()
+        node = parent[index]
+        if type(node) is _TENSOR or not _is_container(node):
+            parent[index] = conversion(node)
+            continue
+        children = list(node.values() if isinstance(node, dict) else node)
+        parent[index] = children
+        containers.append((parent, index, node))
+        stack.extend((children, i) for i in range(len(children)))
+    # Containers are recorded after their parents, so going backwards
+    # rebuilds the innermost ones first.
+    for parent, index, node in reversed(containers):
+        parent[index] = _rebuild(node, parent[index])
+    return holder[0]
+
+
+def _apply_conversion(val, conversion):
+    if tree_map is not None:
+        return tree_map(conversion, val)
+    return conversion_helper(val, conversion)
 
 
 def fp32_to_float16(val, float16_convertor):
     """Convert fp32 `val` to fp16/bf16"""
-    def half_conversion(val):
-        val_typecheck = val
-        if isinstance(val_typecheck, (Parameter, Variable)):
-            val_typecheck = val.data
-        if isinstance(val_typecheck, _FLOAT_TYPES):
-            val = float16_convertor(val)
-        return val
-
-    return conversion_helper(val, half_conversion)
+    return _apply_conversion(
+        val,
+        functools.partial(_half_conversion,
+                          float16_convertor=float16_convertor))
 
 
 def float16_to_fp32(val):
     """Convert fp16/bf16 `val` to fp32"""
-    def float_conversion(val):
-        val_typecheck = val
-        if isinstance(val_typecheck, (Parameter, Variable)):
-            val_typecheck = val.data
-        if isinstance(val_typecheck, (_BF16_TYPES, _HALF_TYPES)):
-            val = val.float()
-        return val
-
-    return conversion_helper(val, float_conversion)
+    return _apply_conversion(val, _float_conversion)
+
+
+def _cast_bucket(bucket, target_dtype):
+    """Cast one bucket of (slots, name, is_param) entries with a single
+    batched copy and swap the results in."""
+    sources = [slots[name] for slots, name, _ in bucket]
+    targets = [torch.empty_like(t, dtype=target_dtype) for t in sources]
+    torch._foreach_copy_(targets, sources)
+    for (slots, name, is_param), target in zip(bucket, targets):
+        if is_param:
+            slots[name].data = target
+        else:
+            slots[name] = target
+
+
+def _bulk_cast(module, target_dtype):
+    """Cast floating point parameters and buffers of `module` to
+    `target_dtype` in place, like module.half()/module.bfloat16(), but
+    with one batched copy per bucket of at most _BULK_CAST_BUCKET_BYTES
+    instead of one cast per tensor."""
+    if not hasattr(torch, "_foreach_copy_"):
+        return module.to(target_dtype)
+
+    # Only record where each tensor lives, not the tensor itself, so the
+    # fp32 originals are freed as soon as their bucket is swapped and peak
+    # memory stays at the model plus one bucket. Parameters keep their
+    # identity and only get new .data, buffers are swapped in their owner.
+    groups = {}
+    seen = set()
+    for owner in module.modules():
+        owned = ((owner._parameters, True), (owner._buffers, False))
+        for slots, is_param in owned:
+            for name, tensor in slots.items():
+                if (tensor is None or not tensor.is_floating_point()
+                        or tensor.dtype == target_dtype):
+                    continue
+                if is_param:
+                    # Shared parameters are cast once through .data.
+                    if id(tensor) in seen:
+                        continue
+                    seen.add(id(tensor))
+                groups.setdefault((tensor.device, tensor.dtype), []).append(
+                    (slots, name, is_param))
+
+    for entries in groups.values():
+        bucket, bucket_bytes = [], 0
+        for slots, name, is_param in entries:
+            tensor = slots[name]
+            bucket.append((slots, name, is_param))
+            bucket_bytes += tensor.numel() * tensor.element_size()
+            if bucket_bytes >= _BULK_CAST_BUCKET_BYTES:
+                _cast_bucket(bucket, target_dtype)
+                bucket, bucket_bytes = [], 0
+        if bucket:
+            _cast_bucket(bucket, target_dtype)
+    return module
 
 
 class Float16Module(MegatronModule):
@@ -150,29 +284,62 @@ class Float16Module(MegatronModule):
         super(Float16Module, self).__init__()
 
         if args.fp16:
-            self.add_module("module", module.half())
-
-            def float16_convertor(val):
-                return val.half()
-
+            _bulk_cast(module, torch.half)
+            self.float16_convertor = torch.Tensor.half
         elif args.bf16:
-            self.add_module("module", module.bfloat16())
-
-            def float16_convertor(val):
-                return val.bfloat16()
-
+            _bulk_cast(module, torch.bfloat16)
+            self.float16_convertor = torch.Tensor.bfloat16
         else:
             raise Exception("should not be here")
+        # The cast is done in place and "module" is a known-good name, so
+        # register it directly instead of going through add_module().
+        self._modules["module"] = module
+
+        # Bind the fp32 -> fp16/bf16 leaf conversion once, not per call.
+        self._half_conversion = functools.partial(
+            _half_conversion, float16_convertor=self.float16_convertor)
+        self._convert = _apply_conversion
+        torch_compile = getattr(torch, "compile", None)
+        if args.use_torch_compile and torch_compile is not None:
+            # Dynamic shapes avoid recompiling for every new sequence length.
+            self._convert = torch_compile(_apply_conversion, dynamic=True)
+
+        self._bind_stage_forward()
+
+    def _bind_stage_forward(self):
+        """Cache whether this module is on the first/last pipeline stage
+        and bind the matching forward. Only called from __init__: the
+        global virtual pipeline rank is set for this chunk at construction
+        but follows the schedule afterwards."""
+        self._is_first = mpu.is_pipeline_first_stage()
+        self._is_last = mpu.is_pipeline_last_stage()
+        # nn.Module.__call__ still runs hooks before dispatching to the
+        # instance attribute.
+        if self._is_first and self._is_last:
+            self.forward = self._forward_both
+        elif self._is_first:
+            self.forward = self._forward_first
+        elif self._is_last:
+            self.forward = self._forward_last
+        else:
+            # Intermediate stages send and receive fp16/bf16 activations.
+            self.forward = self._forward_middle
+
+    def _forward_both(self, *inputs, **kwargs):
+        inputs = self._convert(inputs, self._half_conversion)
+        outputs = self.module(*inputs, **kwargs)
+        return self._convert(outputs, _float_conversion)
 
-        self.float16_convertor = float16_convertor
+    def _forward_first(self, *inputs, **kwargs):
+        inputs = self._convert(inputs, self._half_conversion)
+        return self.module(*inputs, **kwargs)
 
-    def forward(self, *inputs, **kwargs):
-        if mpu.is_pipeline_first_stage():
-            inputs = fp32_to_float16(inputs, self.float16_convertor)
+    def _forward_last(self, *inputs, **kwargs):
         outputs = self.module(*inputs, **kwargs)
-        if mpu.is_pipeline_last_stage():
-            outputs = float16_to_fp32(outputs)
-        return outputs
+        return self._convert(outputs, _float_conversion)
+
+    def _forward_middle(self, *inputs, **kwargs):
+        return self.module(*inputs, **kwargs)
 
     def state_dict(self, destination=None, prefix="", keep_vars=False):
         return self.module.state_dict(destination, prefix, keep_vars)
@@ -236,8 +236,9 @@ class Float16OptimizerWithFloat16Params(MegatronOptimizer):
                         # Copy tensor model parallel attributes.
                         mpu.copy_tensor_model_parallel_attributes(
                             main_param, param)
-                        if hasattr(param, "shared"):
-                            main_param.shared = param.shared
+                        # main_param is a plain tensor, carry the flag over
+                        # so param_is_not_shared() works on it.
+                        main_param.shared = param.shared
                         # Replace the optimizer params with the new fp32 copy.
                         param_group["params"][i] = main_param
                         fp32_from_float16_params_this_group.append(main_param)
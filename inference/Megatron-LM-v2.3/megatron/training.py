@@ -258,7 +258,14 @@ def get_model(model_provider_func):
 
     # Fp16 conversion.
     if args.fp16 or args.bf16:
-        model = [Float16Module(model_module, args) for model_module in model]
+        # Float16Module binds its pipeline stage, so wrap every model chunk
+        # with its own virtual pipeline rank set.
+        fp16_model = []
+        for i, model_module in enumerate(model):
+            if len(model) > 1:
+                mpu.set_virtual_pipeline_model_parallel_rank(i)
+            fp16_model.append(Float16Module(model_module, args))
+        model = fp16_model
 
     if args.DDP_impl == "torch":
         i = torch.cuda.current_device()